@@ -0,0 +1,107 @@
+# benchmarks/db_batch.py
+"""
+Compare the old per-call pattern for a counting lockout (two global_state
+writes and a user_data upsert, each a text query on its own pooled
+connection) with the prepared statements and batch in database.py.
+
+Runs against DATABASE_URL in a throwaway schema, which is dropped afterwards:
+
+    python benchmarks/db_batch.py [iterations]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import asyncpg
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv()
+
+import database  # noqa: E402
+
+
+# ---------------------- Old Pattern ----------------------
+async def text_set_global_state(pool, key, value):
+    async with pool.acquire() as connection:
+        await connection.execute('''
+            INSERT INTO global_state (key, value)
+            VALUES ($1, $2)
+            ON CONFLICT (key) DO UPDATE SET value = $2
+        ''', key, value)
+
+async def text_create_or_update_user(pool, user_id, saves, last_collected, locked_until, lockout_count):
+    async with pool.acquire() as connection:
+        await connection.execute('''
+            INSERT INTO user_data(user_id, saves, last_collected, locked_until, lockout_count)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (user_id) DO UPDATE
+            SET saves = EXCLUDED.saves,
+                last_collected = EXCLUDED.last_collected,
+                locked_until = EXCLUDED.locked_until,
+                lockout_count = EXCLUDED.lockout_count
+        ''', user_id, saves, last_collected, locked_until, lockout_count)
+
+async def per_call(pool, i, now):
+    await text_create_or_update_user(pool, i % 100, 0, now, now + timedelta(hours=1), i)
+    await text_set_global_state(pool, 'current_count', '1')
+    await text_set_global_state(pool, 'last_counter_id', '0')
+
+# ---------------------- New Pattern ----------------------
+async def prepared(pool, i, now):
+    await database.create_or_update_user(pool, i % 100, 0, now, now + timedelta(hours=1), i)
+    await database.set_global_state(pool, 'current_count', '1')
+    await database.set_global_state(pool, 'last_counter_id', '0')
+
+async def batched(pool, i, now):
+    async with database.batch(pool) as work:
+        work.update_user(i % 100, 0, now, now + timedelta(hours=1), i)
+        work.set_global_state('current_count', '1')
+        work.set_global_state('last_counter_id', '0')
+
+
+async def measure(name, operation, pool, iterations):
+    now = datetime.utcnow()
+    for i in range(20):  # warm up connections and statements
+        await operation(pool, i, now)
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        await operation(pool, i, now)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(
+        f"{name:<10} mean {statistics.mean(timings):7.3f}ms  "
+        f"p50 {timings[len(timings) // 2]:7.3f}ms  "
+        f"p95 {timings[int(len(timings) * 0.95)]:7.3f}ms"
+    )
+
+async def main(iterations):
+    if not database.DATABASE_URL:
+        sys.exit("DATABASE_URL is not set")
+    schema = f"bench_{uuid.uuid4().hex[:8]}"
+    admin = await asyncpg.connect(database.DATABASE_URL)
+    await admin.execute(f'CREATE SCHEMA {schema}')
+    try:
+        pool = await database.create_pool(server_settings={'search_path': schema})
+        try:
+            await database.init_db(pool)
+            print(f"{iterations} lockout writes (1 user upsert + 2 global_state writes)")
+            await measure("per-call", per_call, pool, iterations)
+            await measure("prepared", prepared, pool, iterations)
+            await measure("batch", batched, pool, iterations)
+            stats = database.pool_stats(pool)
+            print(f"acquire wait: {stats['acquire']['avg_ms']:.3f}ms avg, {stats['acquire']['max_ms']:.3f}ms max")
+        finally:
+            await pool.close()
+    finally:
+        await admin.execute(f'DROP SCHEMA {schema} CASCADE')
+        await admin.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -1,12 +1,166 @@
 # database.py
 import asyncpg
+import contextlib
 import os
+import time
 from datetime import datetime
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# The bot is one process doing short queries, a handful of connections is plenty
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 5))
 
-async def create_pool():
-    return await asyncpg.create_pool(DATABASE_URL)
+# Every query the helpers run. Each connection prepares a statement the first
+# time it needs it and keeps it, so later calls skip parsing and planning.
+STATEMENTS = {
+    'get_state': 'SELECT value FROM global_state WHERE key = $1',
+    'get_all_state': 'SELECT key, value FROM global_state',
+    'set_state': '''
+        INSERT INTO global_state (key, value)
+        VALUES ($1, $2)
+        ON CONFLICT (key) DO UPDATE SET value = $2
+    ''',
+    # Only writes when the new count is higher; returns a row if it did
+    'update_highest_count': '''
+        INSERT INTO global_state (key, value)
+        VALUES ('highest_count', $1)
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+        WHERE COALESCE(NULLIF(global_state.value, ''), '0')::bigint < EXCLUDED.value::bigint
+        RETURNING value
+    ''',
+    'get_user': '''
+        SELECT user_id, saves, last_collected, locked_until, lockout_count
+        FROM user_data WHERE user_id = $1
+    ''',
+    'upsert_user': '''
+        INSERT INTO user_data(user_id, saves, last_collected, locked_until, lockout_count)
+        VALUES ($1, $2, $3, $4, $5)
+        ON CONFLICT (user_id) DO UPDATE
+        SET saves = EXCLUDED.saves,
+            last_collected = EXCLUDED.last_collected,
+            locked_until = EXCLUDED.locked_until,
+            lockout_count = EXCLUDED.lockout_count
+    ''',
+    # Default: 1 save, lockout_count 0, no locked_until. Returns no row if the
+    # user already exists, see get_or_create_user.
+    'create_user': '''
+        INSERT INTO user_data(user_id, saves, last_collected, locked_until, lockout_count)
+        VALUES ($1, 1, $2, NULL, 0)
+        ON CONFLICT (user_id) DO NOTHING
+        RETURNING user_id, saves, last_collected, locked_until, lockout_count
+    ''',
+    # Several global_state and user_data writes as one statement: one round
+    # trip, and atomic without an explicit transaction
+    'write_batch': '''
+        WITH state AS (
+            INSERT INTO global_state (key, value)
+            SELECT * FROM unnest($1::text[], $2::text[])
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+        ), users AS (
+            INSERT INTO user_data(user_id, saves, last_collected, locked_until, lockout_count)
+            SELECT * FROM unnest($3::bigint[], $4::integer[], $5::timestamp[], $6::timestamp[], $7::integer[])
+            ON CONFLICT (user_id) DO UPDATE
+            SET saves = EXCLUDED.saves,
+                last_collected = EXCLUDED.last_collected,
+                locked_until = EXCLUDED.locked_until,
+                lockout_count = EXCLUDED.lockout_count
+        )
+        SELECT 1
+    ''',
+    'decay_saves': '''
+        UPDATE user_data SET saves = saves - 1
+        WHERE last_collected < $1 AND saves > 0
+        RETURNING user_id, saves
+    ''',
+    'get_countdowns': 'SELECT * FROM countdowns ORDER BY id',
+    'create_countdown': '''
+        INSERT INTO countdowns(guild_id, channel_id, message_id, title, target, resolution)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING *
+    ''',
+    'update_countdown': '''
+        UPDATE countdowns SET message_id = $2, resolution = $3
+        WHERE id = $1 AND guild_id = $4
+    ''',
+    'delete_countdown': '''
+        DELETE FROM countdowns
+        WHERE id = $1 AND guild_id = $2
+        RETURNING *
+    ''',
+    # Countdowns migrated before guild_id was filled in
+    'set_countdown_guild': 'UPDATE countdowns SET guild_id = $2 WHERE id = $1 AND guild_id IS NULL',
+}
+
+
+class BotConnection(asyncpg.Connection):
+    """Connection that keeps the statements it has prepared."""
+    __slots__ = ('statements',)
+
+
+class PoolStats:
+    """Time spent waiting for a pooled connection and running each statement."""
+
+    def __init__(self):
+        self.acquire = [0, 0.0, 0.0]   # count, total seconds, max seconds
+        self.queries = {}
+
+    @staticmethod
+    def _record(entry, elapsed):
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+
+    def record_acquire(self, elapsed):
+        self._record(self.acquire, elapsed)
+
+    def record_query(self, name, elapsed):
+        self._record(self.queries.setdefault(name, [0, 0.0, 0.0]), elapsed)
+
+    @staticmethod
+    def _summary(entry):
+        count, total, longest = entry
+        return {"count": count, "avg_ms": total * 1000 / count if count else 0.0, "max_ms": longest * 1000}
+
+    def summary(self):
+        return {
+            "acquire": self._summary(self.acquire),
+            "queries": {name: self._summary(entry) for name, entry in self.queries.items()},
+        }
+
+
+stats = PoolStats()
+
+
+async def _init_connection(connection):
+    connection.statements = {}
+
+async def create_pool(**options):
+    return await asyncpg.create_pool(
+        DATABASE_URL, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+        connection_class=BotConnection, init=_init_connection, **options
+    )
+
+def pool_stats(pool):
+    """Pool size plus acquire-wait and per-statement timings since startup."""
+    return {"size": pool.get_size(), "idle": pool.get_idle_size(), **stats.summary()}
+
+@contextlib.asynccontextmanager
+async def acquire(pool):
+    start = time.perf_counter()
+    async with pool.acquire() as connection:
+        stats.record_acquire(time.perf_counter() - start)
+        yield connection
+
+async def run(connection, name, method, *args):
+    """Run a statement from STATEMENTS on ``connection``, preparing it on first use."""
+    statement = connection.statements.get(name)
+    if statement is None:
+        statement = connection.statements[name] = await connection.prepare(STATEMENTS[name])
+    start = time.perf_counter()
+    try:
+        return await getattr(statement, method)(*args)
+    finally:
+        stats.record_query(name, time.perf_counter() - start)
 
 async def init_db(pool):
     async with pool.acquire() as connection:
@@ -27,60 +181,120 @@ async def init_db(pool):
                 value TEXT
             );
         ''')
+        # Create the countdowns table, one row per countdown message
+        await connection.execute('''
+            CREATE TABLE IF NOT EXISTS countdowns (
+                id SERIAL PRIMARY KEY,
+                guild_id BIGINT,
+                channel_id BIGINT NOT NULL,
+                message_id BIGINT,
+                title TEXT NOT NULL,
+                target TIMESTAMPTZ NOT NULL,
+                resolution INTEGER NOT NULL
+            );
+        ''')
 
 
 async def get_global_state(pool, key: str):
-    async with pool.acquire() as connection:
-        row = await connection.fetchrow('SELECT value FROM global_state WHERE key = $1', key)
-        return row['value'] if row else None
+    async with acquire(pool) as connection:
+        return await run(connection, 'get_state', 'fetchval', key)
+
+async def get_all_global_state(pool):
+    """Load every global_state key in one query."""
+    async with acquire(pool) as connection:
+        rows = await run(connection, 'get_all_state', 'fetch')
+        return {row['key']: row['value'] for row in rows}
 
 async def set_global_state(pool, key: str, value: str):
-    async with pool.acquire() as connection:
-        await connection.execute('''
-            INSERT INTO global_state (key, value)
-            VALUES ($1, $2)
-            ON CONFLICT (key) DO UPDATE SET value = $2;
-        ''', key, value)
+    async with acquire(pool) as connection:
+        await run(connection, 'set_state', 'fetch', key, value)
 
 async def get_highest_count(pool):
-    async with pool.acquire() as connection:
-        row = await connection.fetchrow('SELECT value FROM global_state WHERE key = $1', 'highest_count')
-        return int(row['value']) if row and row['value'] else 0
+    value = await get_global_state(pool, 'highest_count')
+    return int(value) if value else 0
 
 async def update_highest_count(pool, current_count):
-    async with pool.acquire() as connection:
-        highest_count = await get_highest_count(pool)
-        if current_count > highest_count:
-            await connection.execute('''
-                INSERT INTO global_state (key, value)
-                VALUES ($1, $2)
-                ON CONFLICT (key) DO UPDATE SET value = $2;
-            ''', 'highest_count', str(current_count))
-            return True
-        return False
+    """Store ``current_count`` if it beats the record. Returns True if it did."""
+    async with acquire(pool) as connection:
+        row = await run(connection, 'update_highest_count', 'fetchrow', str(current_count))
+        return row is not None
 
 async def get_user(pool, user_id: int):
-    async with pool.acquire() as connection:
-        row = await connection.fetchrow('SELECT * FROM user_data WHERE user_id = $1', user_id)
-        return row
+    async with acquire(pool) as connection:
+        return await run(connection, 'get_user', 'fetchrow', user_id)
 
 async def create_or_update_user(pool, user_id: int, saves: int, last_collected: datetime, locked_until, lockout_count: int):
-    async with pool.acquire() as connection:
-        await connection.execute('''
-            INSERT INTO user_data(user_id, saves, last_collected, locked_until, lockout_count)
-            VALUES ($1, $2, $3, $4, $5)
-            ON CONFLICT (user_id) DO UPDATE
-            SET saves = EXCLUDED.saves,
-                last_collected = EXCLUDED.last_collected,
-                locked_until = EXCLUDED.locked_until,
-                lockout_count = EXCLUDED.lockout_count;
-        ''', user_id, saves, last_collected, locked_until, lockout_count)
+    async with acquire(pool) as connection:
+        await run(connection, 'upsert_user', 'fetch', user_id, saves, last_collected, locked_until, lockout_count)
 
 async def get_or_create_user(pool, user_id: int):
-    user = await get_user(pool, user_id)
-    if user is None:
-        now = datetime.utcnow()
-        # Default: 1 save, lockout_count 0, no locked_until
-        await create_or_update_user(pool, user_id, 1, now, None, 0)
-        user = await get_user(pool, user_id)
-    return user
+    async with acquire(pool) as connection:
+        user = await run(connection, 'get_user', 'fetchrow', user_id)
+        if user is None:
+            user = await run(connection, 'create_user', 'fetchrow', user_id, datetime.utcnow())
+        if user is None:
+            # Another connection created the row between the two statements
+            user = await run(connection, 'get_user', 'fetchrow', user_id)
+        return user
+
+async def decay_inactive_saves(pool, cutoff: datetime):
+    """Take a save from everyone who last collected before ``cutoff``. Returns the changed rows."""
+    async with acquire(pool) as connection:
+        return await run(connection, 'decay_saves', 'fetch', cutoff)
+
+
+class Batch:
+    """
+    Collects global_state and user_data writes and applies them with a
+    single statement on commit. Later writes to the same key or user
+    replace earlier ones.
+    """
+
+    def __init__(self):
+        self.state = {}
+        self.users = {}
+
+    def set_global_state(self, key: str, value: str):
+        self.state[key] = value
+
+    def update_user(self, user_id: int, saves: int, last_collected: datetime, locked_until, lockout_count: int):
+        self.users[user_id] = (saves, last_collected, locked_until, lockout_count)
+
+    async def commit(self, pool):
+        if not self.state and not self.users:
+            return
+        users = [(user_id, *row) for user_id, row in self.users.items()]
+        columns = [list(column) for column in zip(*users)] if users else [[], [], [], [], []]
+        async with acquire(pool) as connection:
+            await run(connection, 'write_batch', 'fetch', list(self.state), list(self.state.values()), *columns)
+        self.state.clear()
+        self.users.clear()
+
+@contextlib.asynccontextmanager
+async def batch(pool):
+    """``async with batch(pool) as work:`` commits the collected writes when the block exits cleanly."""
+    work = Batch()
+    yield work
+    await work.commit(pool)
+
+async def get_countdowns(pool):
+    async with acquire(pool) as connection:
+        return await run(connection, 'get_countdowns', 'fetch')
+
+async def create_countdown(pool, guild_id, channel_id: int, title: str, target: datetime, resolution: int, message_id=None):
+    async with acquire(pool) as connection:
+        return await run(connection, 'create_countdown', 'fetchrow',
+                         guild_id, channel_id, message_id, title, target, resolution)
+
+async def update_countdown(pool, countdown_id: int, guild_id, message_id, resolution: int):
+    async with acquire(pool) as connection:
+        await run(connection, 'update_countdown', 'fetch', countdown_id, message_id, resolution, guild_id)
+
+async def set_countdown_guild(pool, countdown_id: int, guild_id: int):
+    async with acquire(pool) as connection:
+        await run(connection, 'set_countdown_guild', 'fetch', countdown_id, guild_id)
+
+async def delete_countdown(pool, countdown_id: int, guild_id):
+    """Delete a countdown if it belongs to ``guild_id``. Returns the deleted row or None."""
+    async with acquire(pool) as connection:
+        return await run(connection, 'delete_countdown', 'fetchrow', countdown_id, guild_id)
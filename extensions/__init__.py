@@ -0,0 +1,2 @@
+# Bot features, each loaded as a discord.py extension when enabled in
+# ENABLED_EXTENSIONS. They can be reloaded at runtime with /reload.
@@ -0,0 +1,129 @@
+import discord
+import logging
+import os
+import asyncio
+from discord.ext import commands
+from discord import app_commands, ui
+
+from scheduler import Priority
+
+# ---------------------- Booster Role ID ----------------------
+# Load from environment. Example:
+EXTRA_BOOSTER_ROLE_ID = int(os.getenv('EXTRA_BOOSTER_ROLE_ID', 1340585194125660211))
+
+
+class BoosterRoleView(ui.View):
+    """
+    A View with a button to manually assign the booster role to
+    all current boosters who don't have it yet.
+    """
+    def __init__(self, outbound, boosters, role):
+        # Remove timeout to avoid "Unknown interaction" error which is ass after 60s
+        super().__init__(timeout=None)
+        self.outbound = outbound
+        self.boosters = boosters
+        self.role = role
+
+    @discord.ui.button(
+    label="Assign Extra Booster Role",
+    style=discord.ButtonStyle.primary,
+    custom_id="assign_booster"
+)
+    async def assign_booster(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # Immediately defer the interaction (acknowledge it) to avoid expiration.
+        await interaction.response.defer(ephemeral=True)
+
+        pending = [
+            self.outbound.submit(("member", interaction.guild.id), lambda m=member: m.add_roles(self.role), Priority.INTERACTIVE)
+            for member in self.boosters if self.role not in member.roles
+        ]
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        count = sum(1 for result in results if not isinstance(result, Exception))
+        # Use followup.send since we've already deferred the response.
+        await interaction.followup.send(f"Assigned extra booster role to {count} member(s).", ephemeral=True)
+
+
+class Booster(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    # ---------------------- Booster Logic ----------------------
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        booster_role = after.guild.get_role(EXTRA_BOOSTER_ROLE_ID)
+        if not booster_role:
+            return  # Booster role not found, exit
+
+        # Retrieve the muted role if set
+        muted_role_id = os.getenv("MUTED_ROLE_ID")
+        muted_role = after.guild.get_role(int(muted_role_id)) if muted_role_id else None
+
+        # Check if the member's boosting status has changed
+        if before.premium_since is None and after.premium_since is not None:
+            # User started boosting: assign booster role if not muted
+            if booster_role not in after.roles:
+                if muted_role is None or muted_role not in after.roles:
+                    try:
+                        await after.add_roles(booster_role)
+                        logging.info(f"Added booster role to {after.display_name}")
+                    except Exception as e:
+                        logging.error(f"Failed to add booster role to {after.display_name}: {e}")
+        elif before.premium_since is not None and after.premium_since is None:
+            # User stopped boosting: remove booster role
+            if booster_role in after.roles:
+                try:
+                    await after.remove_roles(booster_role)
+                    logging.info(f"Removed booster role from {after.display_name}")
+                except Exception as e:
+                    logging.error(f"Failed to remove booster role from {after.display_name}: {e}")
+
+        # If the member gets muted, remove the booster role
+        if muted_role and muted_role in after.roles:
+            if booster_role in after.roles:
+                try:
+                    await after.remove_roles(booster_role)
+                    logging.info(f"Removed booster role from muted member {after.display_name}")
+                except Exception as e:
+                    logging.error(f"Error removing booster role from muted member {after.display_name}: {e}")
+        else:
+            # If the member is unmuted and still boosting, re-add the booster role if missing
+            if after.premium_since is not None and booster_role not in after.roles:
+                try:
+                    await after.add_roles(booster_role)
+                    logging.info(f"Re-added booster role to {after.display_name} after unmute")
+                except Exception as e:
+                    logging.error(f"Failed to re-add booster role to {after.display_name}: {e}")
+
+    @app_commands.command(name="listboosters", description="List all current server boosters.")
+    async def listboosters(self, interaction: discord.Interaction):
+        """
+        Slash command to list all current boosters.
+        Also includes a button to mass-assign the extra booster role.
+        """
+        role = interaction.guild.get_role(EXTRA_BOOSTER_ROLE_ID)
+        if not role:
+            await interaction.response.send_message("Extra Booster role not found. Please check your config.", ephemeral=True)
+            return
+
+        # Filter members who are currently boosting
+        boosters = [m for m in interaction.guild.members if m.premium_since is not None]
+
+        embed = discord.Embed(
+            title="Server Boosters",
+            description=f"Total Boosters: {len(boosters)}",
+            color=discord.Color.blue()
+        )
+
+        if boosters:
+            # Only show the first 20 in the embed to avoid hitting character limits
+            booster_names = "\n".join(member.display_name for member in boosters[:20])
+            embed.add_field(name="Some Boosters:", value=booster_names, inline=False)
+        else:
+            embed.add_field(name="Boosters", value="No boosters found.", inline=False)
+
+        view = BoosterRoleView(self.bot.outbound, boosters, role)
+        await interaction.response.send_message(embed=embed, view=view)
+
+
+async def setup(bot):
+    await bot.add_cog(Booster(bot))
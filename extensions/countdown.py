@@ -0,0 +1,349 @@
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timezone
+
+import discord
+from discord.ext import commands
+from discord import app_commands
+from dateutil.relativedelta import relativedelta
+
+from database import (
+    get_countdowns, create_countdown, update_countdown, delete_countdown, set_countdown_guild,
+    get_global_state, set_global_state
+)
+from scheduler import Priority
+
+MIN_RESOLUTION = 5  # seconds; anything faster just fights the edit rate limit
+RETRY_SECONDS = 60  # how soon to retry a post or edit that failed or was dropped
+# Optional: seeds the countdowns table with the original countdown on first run
+COUNTDOWN_CHANNEL_ID = int(os.getenv("COUNTDOWN_CHANNEL_ID")) if os.getenv("COUNTDOWN_CHANNEL_ID") else None
+TARGET_DATE = datetime(2026, 5, 26, 0, 0, 0, tzinfo=timezone.utc)  # Set the target date (26th May 2026)
+
+
+def calculate_total_months(start, end):
+    return (end.year - start.year) * 12 + end.month - start.month - (1 if end.day < start.day else 0)
+
+
+def render_countdown(countdown, now):
+    """Render the embed description, only down to the countdown's resolution."""
+    target = countdown["target"]
+    if now >= target:
+        return f"The countdown to {target.strftime('%d %b %Y')} has ended!"
+
+    # Total months left (realistically)
+    months = calculate_total_months(now, target)
+    # Days, hours, minutes, seconds still from relativedelta
+    delta = relativedelta(target, now)
+    parts = [("months", months), ("days", delta.days)]
+    resolution = countdown["resolution"]
+    if resolution < 86400:
+        parts.append(("hours", delta.hours))
+    if resolution < 3600:
+        parts.append(("minutes", delta.minutes))
+    if resolution < 60:
+        parts.append(("seconds", delta.seconds))
+    return (
+        f"Time remaining until {target.strftime('%d %b %Y')}:\n"
+        + ", ".join(f"**{value}** {unit}" for unit, value in parts)
+    )
+
+
+def build_embed(countdown, description):
+    return discord.Embed(title=countdown["title"], description=description, color=discord.Color.yellow())
+
+
+class CountdownScheduler:
+    """
+    Runs every countdown from a single timer heap.
+
+    Each heap entry carries the countdown's generation number; changing or
+    removing a countdown bumps it, so older entries are skipped when they
+    come due and a countdown never has more than one live updater.
+    """
+
+    def __init__(self, bot, outbound):
+        self.bot = bot
+        self.outbound = outbound
+        self.pool = None
+        self.countdowns = {}
+        self._rendered = {}
+        self._generation = {}
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # Countdowns whose message is being posted, and the DB writes that follow
+        self._posting = set()
+        self._saves = set()
+
+    async def load(self, pool):
+        self.pool = pool
+        for row in await get_countdowns(pool):
+            self.add(dict(row))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="countdown-scheduler")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._saves:
+            await asyncio.gather(*self._saves, return_exceptions=True)
+
+    # ---------------------- Managing Countdowns ----------------------
+    def add(self, countdown):
+        """Add or replace a countdown and schedule it to render right away."""
+        countdown_id = countdown["id"]
+        self.countdowns[countdown_id] = countdown
+        self._rendered.pop(countdown_id, None)
+        self._schedule(countdown_id, datetime.now(timezone.utc).timestamp())
+
+    def remove(self, countdown_id):
+        self.countdowns.pop(countdown_id, None)
+        self._rendered.pop(countdown_id, None)
+        # Any heap entry still queued for this id is now stale.
+        self._generation[countdown_id] = self._generation.get(countdown_id, 0) + 1
+
+    async def set_resolution(self, countdown_id, resolution):
+        countdown = self.countdowns[countdown_id]
+        countdown["resolution"] = max(MIN_RESOLUTION, resolution)
+        await update_countdown(self.pool, countdown_id, countdown["guild_id"], countdown["message_id"], countdown["resolution"])
+        self.add(countdown)
+
+    def _retry(self, countdown_id):
+        # Check again soon instead of waiting for the next unit to tick over
+        retry = min(self.countdowns[countdown_id]["resolution"], RETRY_SECONDS)
+        self._schedule(countdown_id, datetime.now(timezone.utc).timestamp() + retry)
+
+    def _schedule(self, countdown_id, due):
+        generation = self._generation.get(countdown_id, 0) + 1
+        self._generation[countdown_id] = generation
+        heapq.heappush(self._heap, (due, countdown_id, generation))
+        self._wakeup.set()
+
+    # ---------------------- Timer Loop ----------------------
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = datetime.now(timezone.utc).timestamp()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            due, countdown_id, generation = self._heap[0]
+            if due > now:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            if self._generation.get(countdown_id) != generation or countdown_id not in self.countdowns:
+                continue
+            try:
+                await self._tick(self.countdowns[countdown_id])
+            except Exception as e:
+                logging.error(f"Countdown {countdown_id} update failed: {e}")
+                if countdown_id in self.countdowns:
+                    self._schedule(countdown_id, now + self.countdowns[countdown_id]["resolution"])
+
+    async def _tick(self, countdown):
+        countdown_id = countdown["id"]
+        now = datetime.now(timezone.utc)
+        description = render_countdown(countdown, now)
+
+        if countdown["message_id"] is None:
+            if countdown_id not in self._posting:
+                self._post(countdown, description)
+        elif description != self._rendered.get(countdown_id):
+            channel = self.bot.get_partial_messageable(countdown["channel_id"])
+            message = channel.get_partial_message(countdown["message_id"])
+            edit = self.outbound.edit(message, embed=build_embed(countdown, description))
+            edit.add_done_callback(lambda future: self._edit_done(countdown_id, description, future))
+
+        remaining = (countdown["target"] - now).total_seconds()
+        if remaining <= 0:
+            return  # Finished, nothing left to update
+        # Wake up right when the next visible unit ticks over.
+        resolution = countdown["resolution"]
+        step = remaining % resolution or resolution
+        self._schedule(countdown_id, now.timestamp() + step)
+
+    def _post(self, countdown, description):
+        # Not awaited: a slow or backed up channel mustn't hold up the timer
+        # loop and with it every other countdown.
+        countdown_id = countdown["id"]
+        channel = self.bot.get_partial_messageable(countdown["channel_id"])
+        post = self.outbound.submit(
+            ("message", channel.id),
+            lambda: channel.send(embed=build_embed(countdown, description)),
+            Priority.COSMETIC,
+            max_age=None
+        )
+        self._posting.add(countdown_id)
+        post.add_done_callback(lambda future: self._post_done(countdown_id, description, future))
+
+    def _post_done(self, countdown_id, description, future):
+        self._posting.discard(countdown_id)
+        countdown = self.countdowns.get(countdown_id)
+        if future.cancelled() or countdown is None:
+            return
+        error = future.exception()
+        message = future.result() if error is None else None
+        if message is None:
+            # Failed, or dropped by the scheduler (e.g. shed or shut down)
+            logging.warning(f"Countdown {countdown_id} message wasn't posted: {error or 'dropped'}")
+            self._retry(countdown_id)
+            return
+        countdown["message_id"] = message.id
+        self._rendered[countdown_id] = description
+        save = asyncio.create_task(self._save_message_id(countdown))
+        self._saves.add(save)
+        save.add_done_callback(self._saves.discard)
+
+    async def _save_message_id(self, countdown):
+        try:
+            await update_countdown(self.pool, countdown["id"], countdown["guild_id"],
+                                   countdown["message_id"], countdown["resolution"])
+        except Exception as e:
+            logging.error(f"Couldn't save countdown {countdown['id']} message id: {e}")
+
+    def _edit_done(self, countdown_id, description, future):
+        countdown = self.countdowns.get(countdown_id)
+        if future.cancelled() or countdown is None:
+            return
+        error = future.exception()
+        if error is None and future.result() is not None:
+            # Only now is the message known to show this text.
+            self._rendered[countdown_id] = description
+        elif isinstance(error, discord.NotFound):
+            # Message was deleted, post a fresh one on the next tick.
+            logging.warning(f"Countdown {countdown_id} message is gone, posting a new one.")
+            countdown["message_id"] = None
+            self.add(countdown)
+        else:
+            # Failed, dropped as stale or merged into a newer edit
+            self._retry(countdown_id)
+
+
+# ---------------------- Countdown Commands ----------------------
+async def channel_guild_id(bot, channel_id):
+    """Guild of a channel, or None if it can't be seen. Works before the gateway is up."""
+    try:
+        channel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+    except discord.HTTPException as e:
+        logging.error(f"Couldn't look up countdown channel {channel_id}: {e}")
+        return None
+    guild = getattr(channel, "guild", None)
+    return guild.id if guild is not None else None
+
+async def migrate_legacy_countdown(bot, pool):
+    # Recorded in global_state so deleting every countdown doesn't bring it back
+    if COUNTDOWN_CHANNEL_ID is None or await get_global_state(pool, 'countdown_migrated'):
+        return
+    if not await get_countdowns(pool):
+        guild_id = await channel_guild_id(bot, COUNTDOWN_CHANNEL_ID)
+        if guild_id is None:
+            return  # Try again on the next start
+        message_id = await get_global_state(pool, 'countdown_message_id')
+        await create_countdown(
+            pool, guild_id, COUNTDOWN_CHANNEL_ID, "Lucia GTA 6", TARGET_DATE, 10,
+            message_id=int(message_id) if message_id else None
+        )
+        logging.info("Moved the COUNTDOWN_CHANNEL_ID countdown into the countdowns table.")
+    await set_global_state(pool, 'countdown_migrated', '1')
+
+async def backfill_countdown_guilds(bot, pool):
+    """Give countdowns migrated without a guild_id the guild of their channel."""
+    for row in await get_countdowns(pool):
+        if row["guild_id"] is None:
+            guild_id = await channel_guild_id(bot, row["channel_id"])
+            if guild_id is not None:
+                await set_countdown_guild(pool, row["id"], guild_id)
+
+
+class CountdownCommands(commands.GroupCog, group_name="countdown"):
+    def __init__(self, bot):
+        self.bot = bot
+        self.countdowns = CountdownScheduler(bot, bot.outbound)
+
+    async def cog_load(self):
+        # Move the old single env-configured countdown into the countdowns
+        # table once, then run everything from the table.
+        await migrate_legacy_countdown(self.bot, self.bot.db_pool)
+        await backfill_countdown_guilds(self.bot, self.bot.db_pool)
+        await self.countdowns.load(self.bot.db_pool)
+        self.countdowns.start()
+
+    async def cog_unload(self):
+        await self.countdowns.close()
+
+    def get_countdown(self, interaction, countdown_id):
+        """Return the countdown if the interaction's guild may manage it."""
+        countdown = self.countdowns.countdowns.get(countdown_id)
+        if countdown is None or countdown["guild_id"] != interaction.guild.id:
+            return None
+        return countdown
+
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.command(name="create", description="Start a countdown message in a channel.")
+    @app_commands.describe(
+        target="Target date and time in UTC, e.g. 2026-05-26 00:00",
+        resolution="Seconds between updates; coarser resolutions hide smaller units."
+    )
+    async def create(self, interaction: discord.Interaction, channel: discord.TextChannel, title: str,
+                     target: str, resolution: app_commands.Range[int, MIN_RESOLUTION, 86400] = 60):
+        try:
+            target_date = datetime.strptime(target, "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+        except ValueError:
+            await interaction.response.send_message("Use the format `YYYY-MM-DD HH:MM` (UTC).", ephemeral=True)
+            return
+        if target_date <= datetime.now(timezone.utc):
+            await interaction.response.send_message("The target date must be in the future.", ephemeral=True)
+            return
+        row = await create_countdown(self.bot.db_pool, interaction.guild.id, channel.id, title, target_date, resolution)
+        self.countdowns.add(dict(row))
+        await interaction.response.send_message(f"Countdown #{row['id']} started in {channel.mention}.", ephemeral=True)
+
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.command(name="list", description="List the running countdowns.")
+    async def list_countdowns(self, interaction: discord.Interaction):
+        lines = [
+            f"**#{c['id']}** {c['title']} in <#{c['channel_id']}>, "
+            f"ends <t:{int(c['target'].timestamp())}:f>, every {c['resolution']}s"
+            for c in self.countdowns.countdowns.values()
+            if self.get_countdown(interaction, c["id"]) is not None
+        ]
+        await interaction.response.send_message("\n".join(lines) or "No countdowns running.", ephemeral=True)
+
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.command(name="resolution", description="Change how often a countdown updates.")
+    async def set_resolution(self, interaction: discord.Interaction, countdown_id: int,
+                             seconds: app_commands.Range[int, MIN_RESOLUTION, 86400]):
+        if self.get_countdown(interaction, countdown_id) is None:
+            await interaction.response.send_message(f"No countdown #{countdown_id}.", ephemeral=True)
+            return
+        await self.countdowns.set_resolution(countdown_id, seconds)
+        await interaction.response.send_message(f"Countdown #{countdown_id} now updates every {seconds}s.", ephemeral=True)
+
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.command(name="delete", description="Stop and remove a countdown.")
+    async def delete(self, interaction: discord.Interaction, countdown_id: int):
+        row = None
+        if self.get_countdown(interaction, countdown_id) is not None:
+            row = await delete_countdown(self.bot.db_pool, countdown_id, interaction.guild.id)
+        if row is None:
+            await interaction.response.send_message(f"No countdown #{countdown_id}.", ephemeral=True)
+            return
+        self.countdowns.remove(countdown_id)
+        await interaction.response.send_message(f"Countdown #{countdown_id} removed.", ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(CountdownCommands(bot))
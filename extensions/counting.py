@@ -0,0 +1,294 @@
+import asyncio
+import discord
+import logging
+import os
+from discord.ext import commands, tasks
+from discord import app_commands
+from datetime import datetime, timedelta
+
+from database import batch, decay_inactive_saves, get_or_create_user, get_global_state, set_global_state, get_highest_count, update_highest_count
+from scheduler import Priority
+from utils import current_time, get_local_time
+
+# ---------------------- Configuration ----------------------
+counting_log_channel_id = int(os.getenv('COUNT_LOG_CHANNEL_ID'))
+bad_counter_role_id = int(os.getenv('BAD_COUNTER_ROLE_ID'))
+# ---------------------- Couting Data Variables ----------------------
+SAVE_LIMIT = int(os.getenv('SAVE_LIMIT'))
+SAVE_COOLDOWN_HOURS = int(os.getenv('SAVE_COOLDOWN_HOURS'))
+DECAY_DAYS = int(os.getenv('DECAY_DAYS'))
+LOCKOUT_HOURS = int(os.getenv('LOCKOUT_HOURS'))
+LOCKOUT_LIMIT = int(os.getenv('LOCKOUT_LIMIT'))
+DECAY_INTERVAL = timedelta(hours=24)
+
+
+class Counting(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.state = bot.runtime
+        self.outbound = bot.outbound
+
+    async def cog_load(self):
+        self.decay_saves.start()
+
+    async def cog_unload(self):
+        self.decay_saves.cancel()
+
+    # ---------------------- State Helpers ----------------------
+    async def load_user(self, user_id):
+        """Return a user_data row as a dict, from the cache when possible."""
+        user = self.state.users.get(user_id)
+        if user is None:
+            user = dict(await get_or_create_user(self.bot.db_pool, user_id))
+        self.state.remember_user(user)
+        return dict(user)
+
+    async def save(self, user=None, count=False):
+        """Write a user row and/or the count to the DB in one round trip."""
+        state = self.state
+        async with state.writing(self.bot.db_pool):
+            async with batch(self.bot.db_pool) as work:
+                if user is not None:
+                    work.update_user(
+                        user["user_id"], user["saves"],
+                        user["last_collected"],
+                        user["locked_until"],
+                        user["lockout_count"]
+                    )
+                if count:
+                    work.set_global_state('current_count', str(state.current_count))
+                    work.set_global_state('last_counter_id', str(state.last_counter_id or 0))
+            if user is not None:
+                state.remember_user(user)
+
+    async def save_user(self, user):
+        await self.save(user=user)
+
+    async def save_count(self):
+        await self.save(count=True)
+
+    # ---------------------- Counting Bot Commands ----------------------
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.command(name="count_channel", description="Set a channel for the counting game.")
+    async def set_count_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
+        async with self.state.writing(self.bot.db_pool):
+            self.state.count_channel_id = channel.id
+            await set_global_state(self.bot.db_pool, 'count_channel_id', str(channel.id))
+        await interaction.response.send_message(f"Counting channel has been set to {channel.mention}.")
+
+    @app_commands.command(name="collectsave", description="Collect your daily save.")
+    async def collect_save(self, interaction: discord.Interaction):
+        user_id = interaction.user.id
+        now = current_time()
+        user = await self.load_user(user_id)
+        time_since_last = now - user["last_collected"]
+
+        if time_since_last < timedelta(hours=SAVE_COOLDOWN_HOURS):
+            remaining_time = timedelta(hours=SAVE_COOLDOWN_HOURS) - time_since_last
+            hours, remainder = divmod(remaining_time.seconds, 3600)
+            minutes = remainder // 60
+            await interaction.response.send_message(
+                f"You can collect your next save in {hours} hour(s) and {minutes} minute(s)."
+            )
+            return
+
+        if user["saves"] >= SAVE_LIMIT:
+            await interaction.response.send_message(
+                f"You already have the maximum number of saves ({SAVE_LIMIT}). Use them wisely!"
+            )
+            return
+
+        user["saves"] += 1
+        user["last_collected"] = now
+        await self.save_user(user)
+        await interaction.response.send_message(f"Save collected! You now have {user['saves']} save(s).")
+
+    @app_commands.command(name="save", description="Check your current number of saves.")
+    async def check_saves(self, interaction: discord.Interaction):
+        user_id = interaction.user.id
+        user = await self.load_user(user_id)
+        await interaction.response.send_message(f"{interaction.user.mention}, you currently have {user['saves']} save(s).")
+
+    @app_commands.command(name="count_record", description="Display the highest count achieved in the counting game.")
+    async def count_record(self, interaction: discord.Interaction):
+        """Display the highest count achieved in the counting game."""
+        highest_count = await get_highest_count(self.bot.db_pool)
+        current_count = self.state.current_count
+
+        embed = discord.Embed(
+            title="🏆 Counting Game Record",
+            description=f"The highest count achieved in the counting game is **{highest_count}**!",
+            color=discord.Color.gold(),
+            timestamp=get_local_time()
+        )
+
+        embed.add_field(
+            name="Current Count",
+            value=f"The current count is **{current_count}**",
+            inline=True
+        )
+
+        embed.add_field(
+            name="Progress",
+            value=f"**{round((current_count / highest_count) * 100 if highest_count > 0 else 0)}%** of the record",
+            inline=True
+        )
+
+        embed.set_footer(text=f"Requested by {interaction.user}", icon_url=interaction.user.avatar.url)
+
+        await interaction.response.send_message(embed=embed)
+
+    # ---------------------- Counting Logic & Lockouts ----------------------
+    async def log_bad_counter(self, member, lockout_count, timestamp):
+        log_channel = self.bot.get_channel(counting_log_channel_id)
+        if not log_channel:
+            logging.warning("Counting log channel not found. Please check the channel ID.")
+            return
+        embed = discord.Embed(
+            title="Bad Counter Role Assigned",
+            description=f"{member.mention} has been locked out {lockout_count} times and was assigned the 'bad counter' role.",
+            color=discord.Color.red(),
+        )
+        embed.add_field(name="User", value=f"{member} ({member.id})", inline=False)
+        embed.add_field(name="Timestamp", value=timestamp.strftime("%Y-%m-%d %H:%M:%S UTC"), inline=False)
+        embed.set_thumbnail(url=member.display_avatar.url)
+        embed.set_footer(text="Counting Game Log")
+        self.outbound.send(log_channel, Priority.MODERATION_LOG, embed=embed)
+
+    @tasks.loop(seconds=DECAY_INTERVAL.total_seconds())
+    async def decay_saves(self):
+        """Decay saves for inactive users."""
+        now = current_time()
+        async with self.state.writing(self.bot.db_pool):
+            rows = await decay_inactive_saves(self.bot.db_pool, now - timedelta(days=DECAY_DAYS))
+            for row in rows:
+                cached = self.state.users.get(row['user_id'])
+                if cached is not None:
+                    self.state.users[row['user_id']] = dict(cached, saves=row['saves'])
+        await set_global_state(self.bot.db_pool, 'last_save_decay', now.isoformat())
+
+    @decay_saves.before_loop
+    async def wait_for_decay(self):
+        # The loop runs right away when started, so wait out the rest of the
+        # interval first; otherwise every reload or restart decays again.
+        last_decay = await get_global_state(self.bot.db_pool, 'last_save_decay')
+        if last_decay:
+            remaining = datetime.fromisoformat(last_decay) + DECAY_INTERVAL - current_time()
+            if remaining > timedelta(0):
+                await asyncio.sleep(remaining.total_seconds())
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        state = self.state
+        if message.author.bot or state.count_channel_id is None or message.channel.id != state.count_channel_id:
+            return
+
+        db_pool = self.bot.db_pool
+        outbound = self.outbound
+        user_id = message.author.id
+        now = current_time()
+        user = await self.load_user(user_id)
+
+        # Check lockout
+        if user["locked_until"] and now < user["locked_until"]:
+            try:
+                int(message.content)  # Only respond if numeric
+                remaining_time = user["locked_until"] - now
+                hours, remainder = divmod(remaining_time.seconds, 3600)
+                minutes = remainder // 60
+                outbound.reply(
+                    message,
+                    f"{message.author.mention}, you're locked out for another {hours} hour(s) and {minutes} minute(s)."
+                )
+            except ValueError:
+                pass
+            return
+
+        try:
+            number = int(message.content)
+        except ValueError:
+            return  # Ignore non-numeric messages
+
+        # If count is reset and user didn't type 1, warn them
+        if state.current_count == 1 and number != 1:
+            outbound.react(message, "⚠️")
+            outbound.reply(message, f"{message.author.mention}, the next number is **1**!")
+            return
+
+        # Prevent counting twice in a row
+        if state.last_counter_id == user_id and state.current_count != 1:
+            if user["saves"] > 0:
+                user["saves"] -= 1
+                await self.save_user(user)
+                outbound.react(message, "⚠️")
+                outbound.reply(
+                    message,
+                    f"{message.author.mention}, you can't count twice in a row! You've lost a save. "
+                    f"Remaining saves: **{user['saves']}**. The next number is **{state.current_count}**."
+                )
+            else:
+                outbound.react(message, "❌")
+                outbound.reply(
+                    message,
+                    f"{message.author.mention}, **RUINED** it at **{number}**, Next number is **1**. "
+                    f"You can't count twice in a row."
+                )
+                state.current_count = 1
+                state.last_counter_id = None
+                await self.save_count()
+            return
+
+        # Correct count
+        if number == state.current_count:
+            outbound.react(message, "✅")
+            state.current_count += 1
+            state.last_counter_id = user_id
+            await self.save_count()
+
+            # Update highest count if needed and add trophy reaction only for new records
+            is_new_record = await update_highest_count(db_pool, number)  # Check the current number, not the next count
+            if is_new_record:
+                outbound.react(message, "🏆")
+            return
+
+        # Wrong number
+        outbound.react(message, "❌")
+        if user["saves"] > 0:
+            user["saves"] -= 1
+            await self.save_user(user)
+            outbound.reply(
+                message,
+                f"{message.author.mention}, you messed up the counting at **{number}**. "
+                f"You've used a save! Remaining saves: **{user['saves']}**. "
+                f"The next number is **{state.current_count}**."
+            )
+            return
+
+        user["locked_until"] = now + timedelta(hours=LOCKOUT_HOURS)
+        user["lockout_count"] += 1
+        state.current_count = 1
+        state.last_counter_id = None
+        await self.save(user=user, count=True)
+
+        if user["lockout_count"] >= LOCKOUT_LIMIT:
+            guild = message.guild
+            member = guild.get_member(user_id) or await guild.fetch_member(user_id)
+            role = guild.get_role(bad_counter_role_id)
+            if member and role:
+                outbound.submit(("member", guild.id), lambda: member.add_roles(role), Priority.COUNTING)
+                await self.log_bad_counter(member, user["lockout_count"], now)
+            outbound.reply(
+                message,
+                f"{message.author.mention}, you've been locked out {LOCKOUT_LIMIT} times. "
+                "You've been assigned the 'bad counter' role!"
+            )
+        else:
+            outbound.reply(
+                message,
+                f"{message.author.mention}, you messed up the counting at **{number}**. "
+                f"The count has been reset to 1, and you're locked out for the next **{LOCKOUT_HOURS} hours!**"
+            )
+
+
+async def setup(bot):
+    await bot.add_cog(Counting(bot))
@@ -0,0 +1,159 @@
+import discord
+import asyncio
+import io
+import logging
+import os
+import re
+from discord.ext import commands
+
+from scheduler import Priority
+from utils import get_local_time, get_unix_timestamp
+
+# ---------------------- Configuration ----------------------
+LOGGING_CHANNEL_ID = int(os.getenv('LOGGING_CHANNEL_ID'))    # For message deletion logs
+REACTION_LOG_CHANNEL_ID = int(os.getenv('REACTION_LOG_CHANNEL_ID'))  # For reaction logs
+
+
+class Logs(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.media_cache = bot.runtime.media_cache
+        self.session = None
+        # Downloads still using the session
+        self.downloads = set()
+
+    async def cog_load(self):
+        # Only needed for caching attachments, so only imported once this is enabled
+        import aiohttp
+        self.session = aiohttp.ClientSession()
+
+    async def cog_unload(self):
+        for task in self.downloads:
+            task.cancel()
+        await asyncio.gather(*self.downloads, return_exceptions=True)
+        await self.session.close()
+
+    # ---------------------- Media Cache ----------------------
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        # Cache media attachments (for logging message deletions)
+        for attachment in message.attachments:
+            task = asyncio.create_task(self.cache_media(attachment, message), name="cache_media")
+            self.downloads.add(task)
+            task.add_done_callback(self.downloads.discard)
+
+    async def cache_media(self, attachment, message):
+        media_cache = self.media_cache
+        try:
+            async with self.session.get(attachment.url) as response:
+                if response.status == 200:
+                    media_data = await response.read()
+                    if message.id not in media_cache:
+                        media_cache[message.id] = {
+                            "author_id": message.author.id,
+                            "channel_id": message.channel.id,
+                            "attachments": [],
+                            "content": message.content,
+                            "timestamp": message.created_at
+                        }
+                    media_cache[message.id]["attachments"].append({
+                        "media_data": media_data,
+                        "filename": attachment.filename
+                    })
+                else:
+                    logging.warning(f"Failed to download attachment {attachment.filename}, status: {response.status}")
+        except Exception as e:
+            # Runs as a background task, so nothing else would see the error
+            logging.warning(f"Failed to download attachment {attachment.filename}: {e}")
+
+    # ---------------------- Deletion Logs ----------------------
+    @commands.Cog.listener()
+    async def on_message_delete(self, message):
+        if message.author == self.bot.user:
+            return
+        channel = self.bot.get_channel(LOGGING_CHANNEL_ID)
+        if channel:
+            outbound = self.bot.outbound
+            truncated_content = (message.content or '[Media deleted]')[:2048]
+            embed = discord.Embed(
+                title="🗑️ Message Deleted",
+                description=(
+                    f"A message sent by **{message.author}** was deleted in **{message.channel}**\n\n"
+                    f"**Original Message Content:**\n{truncated_content}"
+                ),
+                color=discord.Color.red()
+            )
+            embed.set_author(name=message.author, icon_url=message.author.avatar.url)
+            embed.set_footer(text=f"User ID: {message.author.id} | Message ID: {message.id}")
+            timestamp = int(message.created_at.timestamp())
+            embed.add_field(name="Timestamp", value=f"Sent at <t:{timestamp}:f>", inline=False)
+            urls = re.findall(r'(https?://\S+)', message.content or "")
+            if urls:
+                embed.add_field(name="Links in Message", value="Links have been logged separately.", inline=False)
+
+            cached_message = self.media_cache.pop(message.id, None)
+            image_files = []
+            video_files = []
+            if cached_message:
+                for media_item in cached_message["attachments"]:
+                    media_file = discord.File(io.BytesIO(media_item["media_data"]), filename=media_item["filename"])
+                    if media_item["filename"].lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp")):
+                        image_files.append(media_file)
+                    elif media_item["filename"].lower().endswith((".mp4", ".mov", ".avi", ".mkv")):
+                        video_files.append(media_file)
+
+                outbound.send(channel, Priority.MODERATION_LOG, embed=embed)
+                if image_files:
+                    outbound.send(channel, Priority.MODERATION_LOG, files=image_files)
+                if video_files:
+                    outbound.send(channel, Priority.MODERATION_LOG, files=video_files)
+            else:
+                outbound.send(channel, Priority.MODERATION_LOG, embed=embed)
+
+            for url in urls:
+                outbound.send(channel, Priority.MODERATION_LOG, content=f"🔗 **Link:** {url}")
+
+    # ---------------------- Reaction Logs ----------------------
+    @commands.Cog.listener()
+    async def on_reaction_add(self, reaction, user):
+        if user.bot:
+            return
+        try:
+            log_channel = self.bot.get_channel(REACTION_LOG_CHANNEL_ID)
+            if log_channel is None:
+                logging.error(f"Reaction log channel not found: {REACTION_LOG_CHANNEL_ID}")
+                return
+            embed = discord.Embed(title="Reaction Added", color=discord.Color.green(), timestamp=get_local_time())
+            embed.add_field(name="User", value=user.mention, inline=True)
+            embed.add_field(name="Channel", value=reaction.message.channel.mention, inline=True)
+            embed.add_field(name="Message", value=f"[Jump to message]({reaction.message.jump_url})", inline=True)
+            embed.add_field(name="Reaction", value=str(reaction.emoji), inline=True)
+            embed.add_field(name="Time", value=f"<t:{get_unix_timestamp()}:f>", inline=False)
+            self.bot.outbound.send(log_channel, Priority.MODERATION_LOG, embed=embed)
+            logging.info(f"Logged reaction add by {user} in {reaction.message.channel}")
+        except Exception as e:
+            logging.error(f"Error in on_reaction_add: {e}")
+
+    @commands.Cog.listener()
+    async def on_reaction_remove(self, reaction, user):
+        if user.bot:
+            return
+        try:
+            log_channel = self.bot.get_channel(REACTION_LOG_CHANNEL_ID)
+            if log_channel is None:
+                logging.error(f"Reaction log channel not found: {REACTION_LOG_CHANNEL_ID}")
+                return
+            embed = discord.Embed(title="Reaction Removed", color=discord.Color.red(), timestamp=get_local_time())
+            embed.add_field(name="User", value=user.mention, inline=True)
+            embed.add_field(name="Channel", value=reaction.message.channel.mention, inline=True)
+            embed.add_field(name="Message", value=f"[Jump to message]({reaction.message.jump_url})", inline=True)
+            embed.add_field(name="Reaction", value=str(reaction.emoji), inline=True)
+            embed.add_field(name="Time", value=f"<t:{get_unix_timestamp()}:f>", inline=False)
+            self.bot.outbound.send(log_channel, Priority.MODERATION_LOG, embed=embed)
+            logging.info(f"Logged reaction remove by {user} in {reaction.message.channel}")
+        except Exception as e:
+            logging.error(f"Error in on_reaction_remove: {e}")
+
+
+async def setup(bot):
+    await bot.add_cog(Logs(bot))
@@ -0,0 +1,60 @@
+import discord
+import os
+import time
+from discord.ext import commands
+
+from scheduler import Priority
+
+# ---------------------- Configuration ----------------------
+PING_LIMIT = int(os.getenv('PING_LIMIT'))
+TIME_FRAME = int(os.getenv('TIME_FRAME'))
+LOG_CHANNEL_ID = int(os.getenv('PING_CHANNEL_LOGGING_ID'))  # For excessive ping alerts
+
+
+class PingMonitor(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.ping_logs = bot.runtime.ping_logs
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.author.bot or not message.mentions:
+            return
+        # Pings in the counting channel are part of the game, not spam
+        if message.channel.id == self.bot.runtime.count_channel_id:
+            return
+
+        ping_logs = self.ping_logs
+        for mentioned_user in message.mentions:
+            uid = mentioned_user.id
+            timestamp = time.time()
+            if uid not in ping_logs:
+                ping_logs[uid] = []
+            ping_logs[uid].append((timestamp, message.author.id))
+            # Keep only pings within TIME_FRAME
+            ping_logs[uid] = [(t, p) for t, p in ping_logs[uid] if timestamp - t <= TIME_FRAME]
+
+            if len(ping_logs[uid]) >= PING_LIMIT:
+                log_channel = self.bot.get_channel(LOG_CHANNEL_ID)
+                if log_channel:
+                    pingers = [f"<@{pinger}>" for _, pinger in ping_logs[uid]]
+                    embed = discord.Embed(
+                        title="🚨 Excessive Ping Alert",
+                        description=f"User **{mentioned_user}** received excessive pings!",
+                        color=discord.Color.red()
+                    )
+                    embed.add_field(name="Pinged User", value=f"<@{uid}>", inline=False)
+                    embed.add_field(
+                        name="Pings Received",
+                        value=f"{len(ping_logs[uid])} pings within {TIME_FRAME} seconds",
+                        inline=False
+                    )
+                    embed.add_field(name="Pingers", value=", ".join(pingers), inline=False)
+                    embed.set_footer(text=f"Detected by {self.bot.user.name}", icon_url=self.bot.user.avatar.url)
+                    embed.timestamp = discord.utils.utcnow()
+                    self.bot.outbound.send(log_channel, Priority.MODERATION_LOG, embed=embed)
+                ping_logs[uid] = []
+
+
+async def setup(bot):
+    await bot.add_cog(PingMonitor(bot))
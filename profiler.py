@@ -0,0 +1,140 @@
+# profiler.py
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _task_label(loop):
+    """Name of the task the loop is currently stepping, for per-coroutine attribution."""
+    task = asyncio.current_task(loop)
+    if task is None:
+        return "[loop]"
+    name = task.get_name()
+    if name.startswith("Task-"):
+        # Unnamed task, the coroutine name says more than a counter
+        name = getattr(task.get_coro(), "__qualname__", name)
+    return f"[{name}]".replace(";", ":")
+
+
+class SamplingProfiler:
+    """
+    Samples the event loop thread's stack from a background thread.
+
+    Stacks are grouped under the asyncio task that was running, so time
+    spent in on_message, cache_media etc. shows up as its own tower in the
+    flamegraph. Output is in the folded format read by flamegraph.pl and
+    speedscope.
+    """
+
+    def __init__(self, loop, interval=0.005):
+        self.loop = loop
+        self.interval = interval
+        self.thread_id = threading.get_ident()  # Must be created on the loop thread
+
+    def run(self, seconds):
+        """Collect samples for ``seconds``. Blocking, call it from a worker thread."""
+        samples = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(_task_label(self.loop))
+                samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+        return samples
+
+    @staticmethod
+    def folded(samples):
+        return "\n".join(f"{stack} {count}" for stack, count in samples.most_common()) + "\n"
+
+    @staticmethod
+    def by_task(samples):
+        tasks = Counter()
+        for stack, count in samples.items():
+            tasks[stack.split(";", 1)[0]] += count
+        return tasks
+
+
+class StallWatchdog:
+    """
+    Detects when the event loop is blocked for longer than ``threshold``.
+
+    A heartbeat task on the loop records the time every few milliseconds and a
+    watchdog thread checks it. If the heartbeat is late, the loop thread's
+    stack is captured while it is still stuck. Once the loop runs again,
+    ``on_stall(duration, stack, resumed=True)`` is called from the watchdog
+    thread with how long it was blocked; a loop that stays stuck for
+    ``give_up`` seconds is reported early with ``resumed=False``.
+    """
+
+    def __init__(self, threshold, on_stall, give_up=10.0):
+        self.threshold = threshold
+        self.on_stall = on_stall
+        self.give_up = give_up
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._thread_id = None
+        self._task = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat(), name="stall-watchdog")
+        threading.Thread(target=self._watch, name="stall-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.threshold / 4)
+
+    def _watch(self):
+        interval = self.threshold / 4
+        while not self._stop.wait(interval):
+            beat = self._beat
+            if time.monotonic() - beat <= self.threshold:
+                continue
+            self.stalls += 1
+            frame = sys._current_frames().get(self._thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<no stack>"
+            # Wait for the loop to come back so the full duration is reported
+            while self._beat == beat and time.monotonic() - beat < self.give_up:
+                if self._stop.wait(interval / 4):
+                    return
+            resumed = self._beat != beat
+            # The heartbeat sleeps ``interval`` between beats; the rest is the block
+            duration = (self._beat if resumed else time.monotonic()) - beat - (interval if resumed else 0)
+            self._report(duration, stack, resumed)
+            if not resumed:
+                # Still stuck: wait quietly for it to end before looking again
+                while self._beat == beat:
+                    if self._stop.wait(interval):
+                        return
+
+    def _report(self, duration, stack, resumed):
+        try:
+            self.on_stall(duration, stack, resumed)
+        except Exception:
+            logging.exception("Stall watchdog callback failed")
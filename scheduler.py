@@ -0,0 +1,337 @@
+# scheduler.py
+import asyncio
+import enum
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+
+
+class Priority(enum.IntEnum):
+    """Outbound priority classes, lowest value is sent first."""
+    INTERACTIVE = 0
+    COUNTING = 1
+    MODERATION_LOG = 2
+    COSMETIC = 3
+
+
+# How long a queued job may wait before it is considered stale and dropped.
+# None means the job is always delivered, no matter how late.
+DEFAULT_MAX_AGE = {
+    Priority.INTERACTIVE: None,
+    Priority.COUNTING: None,
+    Priority.MODERATION_LOG: None,
+    Priority.COSMETIC: 30.0,
+}
+
+# (rate per second, burst capacity) for each route kind. These mirror the
+# buckets Discord applies so we wait here instead of inside discord.py's
+# HTTP client, where every request is first-come-first-served.
+DEFAULT_ROUTE_LIMITS = {
+    "message": (1.0, 5),    # POST /channels/{id}/messages
+    "edit": (1.0, 5),       # PATCH /channels/{id}/messages/{id}
+    "reaction": (4.0, 1),   # PUT /channels/{id}/messages/{id}/reactions
+    "member": (2.0, 10),    # role changes on /guilds/{id}/members
+    "interaction": (5.0, 5),
+}
+# Discord's bot-wide limit across all routes. This is the budget the priority
+# classes compete for: a job needs a token from its route and from here.
+DEFAULT_GLOBAL_LIMIT = (50.0, 50)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Job:
+    __slots__ = ("route", "factory", "priority", "coalesce_key", "deadline", "future", "enqueued")
+
+    def __init__(self, route, factory, priority, coalesce_key, deadline, future, enqueued):
+        self.route = route
+        self.factory = factory
+        self.priority = priority
+        self.coalesce_key = coalesce_key
+        self.deadline = deadline
+        self.future = future
+        self.enqueued = enqueued
+
+
+def _consume_exception(future):
+    # Most jobs are fire-and-forget; mark failures as retrieved so asyncio
+    # doesn't complain about them. The runner already logged the error.
+    if not future.cancelled():
+        future.exception()
+
+
+class OutboundScheduler:
+    """
+    Central queue for outgoing REST calls.
+
+    Jobs are grouped by priority and then by route (e.g. one channel's
+    message bucket). The dispatcher always sends the highest priority job
+    whose route has a token free, and gives it the next token of the shared
+    global bucket, so a flood of logs can't hold up counting replies, and a
+    slow route can't block other routes.
+    Each route has at most one call in flight, so messages on a route are
+    delivered in the order they were sent.
+    """
+
+    def __init__(self, route_limits=None, max_age=None, max_pending=5000, global_limit=DEFAULT_GLOBAL_LIMIT):
+        self.route_limits = dict(DEFAULT_ROUTE_LIMITS, **(route_limits or {}))
+        self._global = TokenBucket(*global_limit)
+        self.max_age = {**DEFAULT_MAX_AGE, **(max_age or {})}
+        self.max_pending = max_pending
+        # priority -> OrderedDict(route -> deque of jobs); routes rotate so
+        # each route in a priority class gets its turn.
+        self._queues = {p: OrderedDict() for p in Priority}
+        self._buckets = {}
+        self._coalesced = {}
+        self._pending = 0
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._inflight = set()
+        # Routes with a call in flight
+        self._busy = set()
+        self._closing = False
+        self._drain_deadline = 0.0
+        self.stats = {"submitted": 0, "sent": 0, "failed": 0, "merged": 0, "dropped": 0}
+
+    # ---------------------- Lifecycle ----------------------
+    def start(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._dispatch(), name="outbound-scheduler")
+
+    async def close(self, timeout=0):
+        """
+        Stop the dispatcher. Queued work keeps being sent for up to
+        ``timeout`` seconds; anything still left after that is dropped and
+        logged.
+        """
+        self._closing = True
+        self._drain_deadline = time.monotonic() + timeout
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        inflight = list(self._inflight)
+        for task in inflight:
+            task.cancel()
+        await asyncio.gather(*inflight, return_exceptions=True)
+        left = {}
+        for priority, queue in self._queues.items():
+            for jobs in queue.values():
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_result(None)
+                    left[priority.name.lower()] = left.get(priority.name.lower(), 0) + 1
+            queue.clear()
+        if left or inflight:
+            self.stats["dropped"] += sum(left.values())
+            logging.warning(f"Outbound scheduler closed with {left or 'no'} queued and {len(inflight)} in-flight calls unsent")
+        self._coalesced.clear()
+        self._busy.clear()
+        self._pending = 0
+
+    # ---------------------- Submitting Work ----------------------
+    def submit(self, route, factory, priority, *, coalesce_key=None, max_age=...):
+        """
+        Queue ``factory`` (a zero-argument callable returning an awaitable)
+        on ``route``. Returns a future with the call's result.
+
+        If ``coalesce_key`` matches a job that hasn't been sent yet, that job
+        is superseded: its future resolves to None and the new job takes its
+        place in the queue.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(_consume_exception)
+        self.stats["submitted"] += 1
+        if self._closing and self._task is None:
+            self.stats["dropped"] += 1
+            logging.warning(f"Dropped outbound {Priority(priority).name.lower()} call on {route}: scheduler is closed")
+            future.set_result(None)
+            return future
+
+        now = time.monotonic()
+        age = self.max_age.get(priority) if max_age is ... else max_age
+        deadline = now + age if age is not None else None
+
+        if coalesce_key is not None:
+            previous = self._coalesced.get(coalesce_key)
+            if previous is not None and not previous.future.done():
+                previous.factory = factory
+                previous.deadline = deadline
+                previous.future.set_result(None)
+                previous.future = future
+                self.stats["merged"] += 1
+                return future
+
+        job = _Job(route, factory, Priority(priority), coalesce_key, deadline, future, now)
+        self._queues[job.priority].setdefault(route, deque()).append(job)
+        if coalesce_key is not None:
+            self._coalesced[coalesce_key] = job
+        self._pending += 1
+        if self._pending > self.max_pending:
+            self._shed()
+        self._wakeup.set()
+        return future
+
+    def send(self, channel, priority, *, coalesce_key=None, **kwargs):
+        return self.submit(("message", channel.id), lambda: channel.send(**kwargs),
+                           priority, coalesce_key=coalesce_key)
+
+    def reply(self, message, content=None, *, priority=Priority.COUNTING, **kwargs):
+        return self.submit(("message", message.channel.id), lambda: message.reply(content, **kwargs), priority)
+
+    def react(self, message, emoji, *, priority=Priority.COUNTING):
+        return self.submit(("reaction", message.channel.id), lambda: message.add_reaction(emoji), priority)
+
+    def edit(self, message, priority=Priority.COSMETIC, **kwargs):
+        """Edit a message. Edits still queued for the same message are merged."""
+        return self.submit(("edit", message.channel.id), lambda: message.edit(**kwargs),
+                           priority, coalesce_key=("edit", message.id))
+
+    # ---------------------- Metrics ----------------------
+    def metrics(self):
+        depth = {
+            p.name.lower(): sum(len(jobs) for jobs in self._queues[p].values())
+            for p in Priority
+        }
+        routes = sum(len(queue) for queue in self._queues.values())
+        return {"pending": self._pending, "depth": depth, "routes": routes,
+                "inflight": len(self._inflight), **self.stats}
+
+    # ---------------------- Dispatching ----------------------
+    def _bucket(self, route):
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            rate, capacity = self.route_limits.get(route[0], (1.0, 1))
+            bucket = self._buckets[route] = TokenBucket(rate, capacity)
+        return bucket
+
+    def _remove(self, job, queue, jobs):
+        jobs.popleft()
+        if not jobs:
+            del queue[job.route]
+        if job.coalesce_key is not None and self._coalesced.get(job.coalesce_key) is job:
+            del self._coalesced[job.coalesce_key]
+        self._pending -= 1
+
+    def _drop(self, job, reason):
+        job.future.set_result(None)
+        self.stats["dropped"] += 1
+        logging.warning(f"Dropped outbound {job.priority.name.lower()} call on {job.route}: {reason}")
+
+    def _shed(self):
+        # Over capacity: drop the oldest job from the lowest priority class
+        # that allows dropping at all.
+        for priority in reversed(Priority):
+            if self.max_age.get(priority) is None:
+                continue
+            queue = self._queues[priority]
+            if queue:
+                route, jobs = next(iter(queue.items()))
+                job = jobs[0]
+                self._remove(job, queue, jobs)
+                self._drop(job, f"queue over {self.max_pending} jobs")
+                return
+
+    def _next_job(self, now):
+        """Pop the next sendable job, or return the seconds to wait for one."""
+        wait = None
+        for priority in Priority:
+            queue = self._queues[priority]
+            for route in list(queue):
+                jobs = queue[route]
+                # Throw away anything that went stale while waiting.
+                while jobs and jobs[0].deadline is not None and jobs[0].deadline < now:
+                    stale = jobs[0]
+                    self._remove(stale, queue, jobs)
+                    self._drop(stale, f"stale after {now - stale.enqueued:.0f}s")
+                if not jobs or route in self._busy:
+                    continue
+                delay = self._bucket(route).delay(now)
+                if delay == 0:
+                    # Highest priority job that can go; it gets the next
+                    # global token, lower priorities wait behind it.
+                    global_delay = self._global.delay(now)
+                    if global_delay > 0:
+                        return None, global_delay
+                    job = jobs[0]
+                    self._remove(job, queue, jobs)
+                    if route in queue:
+                        queue.move_to_end(route)
+                    self._bucket(route).take(now)
+                    self._global.take(now)
+                    return job, None
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            if self._closing and (now >= self._drain_deadline or not (self._pending or self._busy)):
+                return
+            job, wait = self._next_job(now)
+            if job is None:
+                if self._closing:
+                    remaining = self._drain_deadline - now
+                    wait = remaining if wait is None else min(wait, remaining)
+                await self._sleep(wait)
+                continue
+            self._busy.add(job.route)
+            task = asyncio.create_task(self._run(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _sleep(self, timeout):
+        # asyncio.wait instead of wait_for: on 3.11 wait_for can swallow a
+        # cancellation that arrives just as the event is set.
+        waiter = asyncio.ensure_future(self._wakeup.wait())
+        try:
+            await asyncio.wait((waiter,), timeout=timeout)
+        finally:
+            waiter.cancel()
+
+    async def _run(self, job):
+        future = job.future
+        try:
+            result = await job.factory()
+        except Exception as e:
+            self.stats["failed"] += 1
+            logging.warning(f"Outbound {job.priority.name.lower()} call on {job.route} failed: {e}")
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.stats["sent"] += 1
+            if not future.done():
+                future.set_result(result)
+        finally:
+            if not future.done():
+                future.cancel()  # Cancelled by close()
+            self._busy.discard(job.route)
+            self._wakeup.set()
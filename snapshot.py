@@ -0,0 +1,341 @@
+# snapshot.py
+import asyncio
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+import uuid
+from datetime import datetime, timezone
+
+from database import set_global_state
+
+# File layout (little endian):
+#   header   magic "MPDB", format version, written_at, 16 byte token
+#   sections tag (4 bytes) + payload length + payload, unknown tags are skipped
+# Attachment bytes are not in the snapshot itself but appended to a separate
+# media blob file, so each snapshot only writes the attachments that are new.
+SNAPSHOT_VERSION = 1
+MAGIC = b"MPDB"
+HEADER = struct.Struct("<4sHd16s")
+SECTION = struct.Struct("<4sI")
+COUNT = struct.Struct("<I")
+COUNTING = struct.Struct("<qqq")           # count channel id, current count, last counter id
+USER = struct.Struct("<qiddi")             # user id, saves, last collected, locked until, lockout count
+PING_USER = struct.Struct("<qI")           # pinged user id, number of pings
+PING = struct.Struct("<dq")                # timestamp, pinger id
+MEDIA_MESSAGE = struct.Struct("<qqqdIH")   # message, channel, author, created at, content length, attachments
+ATTACHMENT = struct.Struct("<HQQ")         # filename length, blob offset, blob length
+
+TAG_COUNTING = b"CNT "
+TAG_USERS = b"USR "
+TAG_PINGS = b"PNG "
+TAG_MEDIA = b"MED "
+
+# Rewrite the blob file once this much of it belongs to messages that are gone
+COMPACT_MIN_BYTES = 8 * 1024 * 1024
+
+
+def _to_epoch(dt):
+    if dt is None:
+        return math.nan
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # user_data uses naive UTC timestamps
+    return dt.timestamp()
+
+def _naive_utc(value):
+    if math.isnan(value):
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+class Snapshotter:
+    """
+    Saves hot in-memory state to a local file and loads it on startup.
+
+    Covers the counting state, cached user_data rows, ping windows and the
+    media cache. Counting and user rows are only restored if global_state
+    still holds the snapshot's token (see RuntimeState.writing), otherwise
+    the DB has moved on and they are loaded from it as usual.
+    """
+
+    def __init__(self, runtime, directory, interval, media_max_age):
+        self.runtime = runtime
+        self.directory = directory
+        self.path = os.path.join(directory, "snapshot.bin")
+        self.interval = interval
+        self.media_max_age = media_max_age
+        self.pool = None
+        self._lock = asyncio.Lock()
+        self._task = None
+        # Current media blob file and (message id, attachment index) -> (offset, length) in it
+        self._blob_name = None
+        self._blob_index = {}
+
+    # ---------------------- Loading ----------------------
+    def load(self, db_state):
+        """Restore state from the snapshot file. Returns False if it couldn't be used."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                loaded = self._parse(data, db_state)
+            finally:
+                data.close()
+        except (OSError, ValueError, struct.error, UnicodeDecodeError) as e:
+            logging.warning(f"Ignoring unreadable snapshot {self.path}: {e}")
+            return False
+        if loaded is None:
+            return False
+
+        runtime = self.runtime
+        trusted, users, pings, media, blob_name, blob_index, token = loaded
+        if trusted:
+            for user in users:
+                runtime.remember_user(user)
+            runtime.snapshot_token = token
+        runtime.ping_logs.update(pings)
+        for message_id, entry in media.items():
+            runtime.media_cache.setdefault(message_id, entry)
+        self._blob_name, self._blob_index = blob_name, blob_index
+        logging.info(
+            f"Loaded snapshot: {len(users) if trusted else 0} users"
+            f"{'' if trusted else ' (stale, skipped)'}, {len(pings)} ping windows, {len(media)} cached messages"
+        )
+        return True
+
+    def _parse(self, data, db_state):
+        magic, version, _, token = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != SNAPSHOT_VERSION:
+            logging.warning(f"Ignoring snapshot {self.path}: unknown format version {version}")
+            return None
+        token = token.hex()
+        trusted = db_state.get('snapshot_token') == token
+        users, pings, media, blob_name, blob_index = [], {}, {}, None, {}
+
+        pos = HEADER.size
+        while pos < len(data):
+            tag, length = SECTION.unpack_from(data, pos)
+            pos += SECTION.size
+            end = pos + length
+            if tag == TAG_COUNTING:
+                channel_id, current_count, last_counter_id = COUNTING.unpack_from(data, pos)
+                runtime = self.runtime
+                # Same as the DB? Then the token check isn't lying to us either.
+                if (channel_id or None, current_count, last_counter_id or None) != (
+                        runtime.count_channel_id, runtime.current_count, runtime.last_counter_id):
+                    trusted = False
+            elif tag == TAG_USERS:
+                (count,) = COUNT.unpack_from(data, pos)
+                for user_id, saves, last_collected, locked_until, lockout_count in USER.iter_unpack(
+                        data[pos + COUNT.size:pos + COUNT.size + count * USER.size]):
+                    users.append({
+                        "user_id": user_id,
+                        "saves": saves,
+                        "last_collected": _naive_utc(last_collected),
+                        "locked_until": _naive_utc(locked_until),
+                        "lockout_count": lockout_count,
+                    })
+            elif tag == TAG_PINGS:
+                (count,) = COUNT.unpack_from(data, pos)
+                cursor = pos + COUNT.size
+                for _ in range(count):
+                    uid, n = PING_USER.unpack_from(data, cursor)
+                    cursor += PING_USER.size
+                    pings[uid] = list(PING.iter_unpack(data[cursor:cursor + n * PING.size]))
+                    cursor += n * PING.size
+            elif tag == TAG_MEDIA:
+                media, blob_name, blob_index = self._parse_media(data, pos)
+            pos = end
+        return trusted, users, pings, media, blob_name, blob_index, token
+
+    def _parse_media(self, data, pos):
+        (name_length,) = struct.unpack_from("<H", data, pos)
+        pos += 2
+        blob_name = bytes(data[pos:pos + name_length]).decode()
+        pos += name_length
+        blob_path = os.path.join(self.directory, blob_name)
+        if not os.path.exists(blob_path) or os.path.getsize(blob_path) == 0:
+            return {}, None, {}
+        with open(blob_path, "rb") as f:
+            blob = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        media, blob_index = {}, {}
+        (count,) = COUNT.unpack_from(data, pos)
+        pos += COUNT.size
+        for _ in range(count):
+            message_id, channel_id, author_id, created_at, content_length, attachment_count = \
+                MEDIA_MESSAGE.unpack_from(data, pos)
+            pos += MEDIA_MESSAGE.size
+            content = bytes(data[pos:pos + content_length]).decode()
+            pos += content_length
+            attachments, locations = [], {}
+            for index in range(attachment_count):
+                filename_length, offset, length = ATTACHMENT.unpack_from(data, pos)
+                pos += ATTACHMENT.size
+                filename = bytes(data[pos:pos + filename_length]).decode()
+                pos += filename_length
+                # Read straight from the mapped file when the deletion log needs it
+                attachments.append({"media_data": blob[offset:offset + length], "filename": filename})
+                locations[(message_id, index)] = (offset, length)
+            if any(offset + length > len(blob) for offset, length in locations.values()):
+                continue  # Blob was cut short, e.g. by a crash mid-append
+            blob_index.update(locations)
+            media[message_id] = {
+                "author_id": author_id,
+                "channel_id": channel_id,
+                "attachments": attachments,
+                "content": content,
+                "timestamp": datetime.fromtimestamp(created_at, timezone.utc),
+            }
+        return media, blob_name, blob_index
+
+    # ---------------------- Writing ----------------------
+    def start(self, pool):
+        self.pool = pool
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="snapshot")
+
+    async def stop(self):
+        """Stop the periodic snapshots and write a final one."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.write()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.write()
+            except Exception as e:
+                logging.error(f"Failed to write snapshot: {e}")
+
+    async def write(self):
+        if self.pool is None:
+            return  # Never started, nothing was loaded that could be saved
+        async with self._lock:
+            runtime = self.runtime
+            token = uuid.uuid4().bytes
+            # Collected in one go on the loop, so it is a consistent view.
+            # From here on, the first counting/user write clears the token.
+            runtime.snapshot_token = token.hex()
+            consistent = runtime.writes_in_flight == 0
+            state = self._collect()
+            started = time.perf_counter()
+            await asyncio.to_thread(self._write_files, state, token)
+
+            async with runtime.snapshot_lock:
+                if consistent and runtime.snapshot_token == token.hex():
+                    await set_global_state(self.pool, 'snapshot_token', token.hex())
+                else:
+                    runtime.snapshot_token = None
+            logging.info(f"Wrote snapshot in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def _collect(self):
+        runtime = self.runtime
+        cutoff = datetime.now(timezone.utc).timestamp() - self.media_max_age
+        media = []
+        for message_id, entry in runtime.media_cache.items():
+            created_at = entry["timestamp"].timestamp()
+            if created_at >= cutoff and entry["attachments"]:
+                media.append((message_id, entry["channel_id"], entry["author_id"], created_at,
+                              entry["content"] or "", list(entry["attachments"])))
+        return {
+            "counting": (runtime.count_channel_id or 0, runtime.current_count, runtime.last_counter_id or 0),
+            # remember_user replaces rows instead of mutating them, so these are safe to read off-loop
+            "users": list(runtime.users.values()),
+            "pings": [(uid, list(entries)) for uid, entries in runtime.ping_logs.items() if entries],
+            "media": media,
+        }
+
+    def _write_files(self, state, token):
+        os.makedirs(self.directory, exist_ok=True)
+        media_index, old_blob_path = self._append_media(state["media"])
+
+        sections = []
+        sections.append((TAG_COUNTING, COUNTING.pack(*state["counting"])))
+
+        users = state["users"]
+        sections.append((TAG_USERS, COUNT.pack(len(users)) + b"".join(
+            USER.pack(u["user_id"], u["saves"], _to_epoch(u["last_collected"]),
+                      _to_epoch(u["locked_until"]), u["lockout_count"])
+            for u in users
+        )))
+
+        pings = [COUNT.pack(len(state["pings"]))]
+        for uid, entries in state["pings"]:
+            pings.append(PING_USER.pack(uid, len(entries)))
+            pings.extend(PING.pack(t, pinger) for t, pinger in entries)
+        sections.append((TAG_PINGS, b"".join(pings)))
+
+        blob_name = self._blob_name.encode()
+        media = [struct.pack("<H", len(blob_name)), blob_name, COUNT.pack(len(media_index))]
+        for message_id, channel_id, author_id, created_at, content, attachments in media_index:
+            content = content.encode()
+            media.append(MEDIA_MESSAGE.pack(message_id, channel_id, author_id, created_at,
+                                            len(content), len(attachments)))
+            media.append(content)
+            for filename, offset, length in attachments:
+                filename = filename.encode()
+                media.append(ATTACHMENT.pack(len(filename), offset, length))
+                media.append(filename)
+        sections.append((TAG_MEDIA, b"".join(media)))
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, time.time(), token))
+            for tag, payload in sections:
+                f.write(SECTION.pack(tag, len(payload)))
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+        if old_blob_path is not None and os.path.exists(old_blob_path):
+            # Nothing points at it any more; a loaded copy stays mapped until released
+            os.remove(old_blob_path)
+
+    def _append_media(self, media):
+        """
+        Append attachments that aren't in the blob file yet and return the
+        index for the snapshot. Starts a new, compacted blob file when most
+        of the current one belongs to messages that are no longer cached; the
+        old file's path is returned so it can be removed afterwards.
+        """
+        live_bytes = sum(len(a["media_data"]) for *_, attachments in media for a in attachments)
+        blob_path = os.path.join(self.directory, self._blob_name) if self._blob_name else None
+        size = os.path.getsize(blob_path) if blob_path and os.path.exists(blob_path) else 0
+        old_path = None
+        if blob_path is None or (size > COMPACT_MIN_BYTES and size > 2 * live_bytes):
+            old_path = blob_path
+            self._blob_name = f"media-{uuid.uuid4().hex[:12]}.blob"
+            self._blob_index = {}
+            blob_path = os.path.join(self.directory, self._blob_name)
+
+        index, live = [], {}
+        with open(blob_path, "ab") as blob:
+            offset = blob.tell()
+            for message_id, channel_id, author_id, created_at, content, attachments in media:
+                entries = []
+                for i, attachment in enumerate(attachments):
+                    location = self._blob_index.get((message_id, i))
+                    if location is None:
+                        data = attachment["media_data"]
+                        blob.write(data)
+                        location = (offset, len(data))
+                        offset += len(data)
+                    live[(message_id, i)] = location
+                    entries.append((attachment["filename"], *location))
+                index.append((message_id, channel_id, author_id, created_at, content, entries))
+            blob.flush()
+            os.fsync(blob.fileno())
+        self._blob_index = live
+        return index, old_path
@@ -0,0 +1,78 @@
+# state.py
+import asyncio
+import contextlib
+import os
+from collections import OrderedDict
+
+from database import set_global_state
+
+# How many recently seen user_data rows to keep in memory
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1000))
+
+
+class RuntimeState:
+    """
+    In-memory state shared by the extensions.
+
+    It hangs off the bot instead of living in an extension module, so
+    reloading an extension keeps the count, ping windows and media cache.
+    """
+
+    def __init__(self):
+        # Counting game, mirrored to global_state on every change
+        self.count_channel_id = None
+        self.current_count = 1
+        self.last_counter_id = None
+        # user id -> user_data row (as a dict) for recently active users,
+        # least recently used first. The bot is the only writer of user_data,
+        # so rows are written through to the DB and then cached here.
+        self.users = OrderedDict()
+        # user id -> [(timestamp, pinger id)] within the ping time frame
+        self.ping_logs = {}
+        # message id -> cached attachments, for deletion logs
+        self.media_cache = {}
+        # Token of the snapshot that still matches the DB, see snapshot.py
+        self.snapshot_token = None
+        self.snapshot_lock = asyncio.Lock()
+        # Counting/user writes to the DB that haven't finished yet
+        self.writes_in_flight = 0
+
+    def load_counting(self, state):
+        """Fill the counting fields from a global_state key/value dict."""
+        if state.get('count_channel_id') is not None:
+            self.count_channel_id = int(state['count_channel_id'])
+        if state.get('current_count') is not None:
+            self.current_count = int(state['current_count'])
+        last_counter_value = state.get('last_counter_id')
+        if last_counter_value is not None and last_counter_value != "0":
+            self.last_counter_id = int(last_counter_value)
+        else:
+            self.last_counter_id = None
+
+    def remember_user(self, user):
+        # Store a copy: callers mutate their dict before writing it back
+        self.users[user["user_id"]] = dict(user)
+        self.users.move_to_end(user["user_id"])
+        while len(self.users) > USER_CACHE_SIZE:
+            self.users.popitem(last=False)
+
+    @contextlib.asynccontextmanager
+    async def writing(self, pool):
+        """
+        Wrap every write of counting or user state to the DB.
+
+        The first write after a snapshot clears its token in global_state, so
+        a crash can't leave behind a snapshot that looks current but is
+        missing the write. A snapshot taken while a write is in flight is
+        never marked current.
+        """
+        self.writes_in_flight += 1
+        try:
+            if self.snapshot_token is not None:
+                async with self.snapshot_lock:
+                    if self.snapshot_token is not None:
+                        self.snapshot_token = None
+                        await set_global_state(pool, 'snapshot_token', '')
+            yield
+        finally:
+            self.writes_in_flight -= 1
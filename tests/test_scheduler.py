@@ -0,0 +1,170 @@
+import asyncio
+import unittest
+
+from scheduler import OutboundScheduler, Priority
+
+
+def recorder(log, name, delay=0):
+    """Factory that records when the call starts and finishes after ``delay`` seconds."""
+    async def call():
+        log.append(name)
+        await asyncio.sleep(delay)
+        return name
+    return call
+
+
+class GlobalBucketTests(unittest.IsolatedAsyncioTestCase):
+    async def test_counting_gets_global_tokens_before_log_flood(self):
+        # One global token every 10ms; each log is on its own channel, so only
+        # the global bucket stands between them and the counting replies.
+        outbound = OutboundScheduler(global_limit=(100.0, 1))
+        started = []
+        logs = [
+            outbound.submit(("message", channel), recorder(started, f"log{channel}"), Priority.MODERATION_LOG)
+            for channel in range(10)
+        ]
+        counting = [
+            outbound.submit(("message", 1000), recorder(started, f"count{i}"), Priority.COUNTING)
+            for i in range(3)
+        ]
+        outbound.start()
+        await asyncio.gather(*logs, *counting)
+        await outbound.close()
+        self.assertEqual(started[:3], ["count0", "count1", "count2"])
+        self.assertEqual(started[3:], [f"log{channel}" for channel in range(10)])
+
+
+class CloseTests(unittest.IsolatedAsyncioTestCase):
+    async def test_close_drains_queued_jobs(self):
+        outbound = OutboundScheduler()
+        started = []
+        futures = [
+            outbound.submit(("message", 1), recorder(started, f"log{i}", 0.01), Priority.MODERATION_LOG)
+            for i in range(3)
+        ]
+        outbound.start()
+        await asyncio.wait_for(outbound.close(timeout=5), 2)
+        self.assertEqual(started, ["log0", "log1", "log2"])
+        self.assertEqual([f.result() for f in futures], ["log0", "log1", "log2"])
+
+    async def test_close_gives_up_after_timeout(self):
+        outbound = OutboundScheduler()
+        started = []
+        futures = [
+            outbound.submit(("message", 1), recorder(started, f"log{i}", 10), Priority.MODERATION_LOG)
+            for i in range(3)
+        ]
+        outbound.start()
+        await asyncio.sleep(0)
+        with self.assertLogs(level="WARNING"):
+            await asyncio.wait_for(outbound.close(timeout=0.05), 2)
+        self.assertEqual(started, ["log0"])
+        self.assertTrue(all(f.done() for f in futures))
+        self.assertEqual(outbound.metrics()["pending"], 0)
+
+    async def test_close_while_a_call_finishes(self):
+        # Closing right as an in-flight call completes used to hang
+        for _ in range(20):
+            outbound = OutboundScheduler()
+            future = outbound.submit(("message", 1), recorder([], "log"), Priority.MODERATION_LOG)
+            outbound.start()
+            await future
+            await asyncio.wait_for(outbound.close(), 1)
+
+    async def test_submit_after_close_is_dropped(self):
+        outbound = OutboundScheduler()
+        outbound.start()
+        await outbound.close()
+        with self.assertLogs(level="WARNING"):
+            future = outbound.submit(("message", 1), recorder([], "late"), Priority.COUNTING)
+        self.assertIsNone(await future)
+
+
+class MergeTests(unittest.IsolatedAsyncioTestCase):
+    async def test_queued_edits_to_the_same_message_are_merged(self):
+        outbound = OutboundScheduler()
+        calls = []
+        first = outbound.submit(("edit", 1), recorder(calls, "first"), Priority.COSMETIC, coalesce_key=("edit", 5))
+        second = outbound.submit(("edit", 1), recorder(calls, "second"), Priority.COSMETIC, coalesce_key=("edit", 5))
+        # The superseded edit resolves right away, without being sent
+        self.assertIsNone(await first)
+        outbound.start()
+        self.assertEqual(await second, "second")
+        await outbound.close()
+        self.assertEqual(calls, ["second"])
+        self.assertEqual(outbound.metrics()["merged"], 1)
+
+    async def test_edit_already_sent_is_not_merged(self):
+        outbound = OutboundScheduler()
+        outbound.start()
+        calls = []
+        first = outbound.submit(("edit", 1), recorder(calls, "first"), Priority.COSMETIC, coalesce_key=("edit", 5))
+        self.assertEqual(await first, "first")
+        second = outbound.submit(("edit", 1), recorder(calls, "second"), Priority.COSMETIC, coalesce_key=("edit", 5))
+        self.assertEqual(await second, "second")
+        await outbound.close()
+        self.assertEqual(calls, ["first", "second"])
+
+
+class RouteTests(unittest.IsolatedAsyncioTestCase):
+    async def test_one_call_in_flight_per_route(self):
+        outbound = OutboundScheduler()
+        running = {1: 0, 2: 0}
+        most = {1: 0, 2: 0}
+        finished = []
+
+        def call(route, name):
+            async def run():
+                running[route] += 1
+                most[route] = max(most[route], running[route])
+                # Later jobs finish faster, so running them together would reorder them
+                await asyncio.sleep(0.02 - int(name[-1]) * 0.004)
+                running[route] -= 1
+                finished.append(name)
+            return run
+
+        futures = [
+            outbound.submit(("message", route), call(route, f"{route}-{i}"), Priority.MODERATION_LOG)
+            for i in range(4) for route in (1, 2)
+        ]
+        outbound.start()
+        await asyncio.gather(*futures)
+        await outbound.close()
+        self.assertEqual(most, {1: 1, 2: 1})
+        self.assertEqual([name for name in finished if name[0] == "1"], ["1-0", "1-1", "1-2", "1-3"])
+        self.assertEqual([name for name in finished if name[0] == "2"], ["2-0", "2-1", "2-2", "2-3"])
+        # Both routes ran side by side
+        self.assertNotEqual(finished[:4], ["1-0", "1-1", "1-2", "1-3"])
+
+
+class DropTests(unittest.IsolatedAsyncioTestCase):
+    async def test_overflow_only_sheds_cosmetic_work(self):
+        outbound = OutboundScheduler(max_pending=3)
+        logs = [
+            outbound.submit(("message", 1), recorder([], f"log{i}"), Priority.MODERATION_LOG)
+            for i in range(3)
+        ]
+        with self.assertLogs(level="WARNING") as captured:
+            edit = outbound.submit(("edit", 1), recorder([], "edit"), Priority.COSMETIC)
+        self.assertIsNone(await edit)
+        self.assertIn("('edit', 1)", captured.output[0])
+        # Nothing left to shed: moderation logs are kept even over the limit
+        more = outbound.submit(("message", 1), recorder([], "log3"), Priority.MODERATION_LOG)
+        self.assertEqual(outbound.metrics()["pending"], 4)
+        outbound.start()
+        self.assertEqual(await asyncio.gather(*logs, more), ["log0", "log1", "log2", "log3"])
+        await outbound.close()
+        self.assertEqual(outbound.metrics()["dropped"], 1)
+
+    async def test_stale_cosmetic_work_is_dropped(self):
+        outbound = OutboundScheduler(max_age={Priority.COSMETIC: 0.01})
+        calls = []
+        edit = outbound.submit(("edit", 1), recorder(calls, "edit"), Priority.COSMETIC)
+        log = outbound.submit(("message", 1), recorder(calls, "log"), Priority.MODERATION_LOG)
+        await asyncio.sleep(0.05)
+        outbound.start()
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(await edit)
+        self.assertEqual(await log, "log")
+        await outbound.close()
+        self.assertEqual(calls, ["log"])
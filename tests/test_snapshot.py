@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from snapshot import Snapshotter
+from state import RuntimeState
+
+
+class FakeGlobalState:
+    """Stands in for database.set_global_state, keeping the values in a dict."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def __call__(self, pool, key, value):
+        self.values[key] = value
+
+
+def make_runtime():
+    runtime = RuntimeState()
+    runtime.count_channel_id = 10
+    runtime.current_count = 42
+    runtime.last_counter_id = 7
+    return runtime
+
+
+class SnapshotTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.db = FakeGlobalState()
+        for module in ("snapshot", "state"):
+            patcher = mock.patch(f"{module}.set_global_state", self.db)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def snapshotter(self, runtime):
+        snapshots = Snapshotter(runtime, self.directory, interval=300, media_max_age=3600)
+        snapshots.pool = object()  # Only handed to set_global_state
+        return snapshots
+
+    def fill(self, runtime):
+        runtime.remember_user({
+            "user_id": 1, "saves": 2, "last_collected": datetime(2025, 1, 2, 3, 4, 5),
+            "locked_until": None, "lockout_count": 1,
+        })
+        runtime.ping_logs[5] = [(1700000000.5, 6), (1700000001.0, 8)]
+        runtime.media_cache[100] = {
+            "author_id": 3, "channel_id": 4, "content": "hello",
+            "timestamp": datetime.now(timezone.utc),
+            "attachments": [{"media_data": b"png-bytes", "filename": "a.png"}],
+        }
+
+    async def test_round_trip(self):
+        runtime = make_runtime()
+        self.fill(runtime)
+        await self.snapshotter(runtime).write()
+        self.assertIn("snapshot_token", self.db.values)
+
+        restored = make_runtime()
+        self.assertTrue(self.snapshotter(restored).load(self.db.values))
+        self.assertEqual(restored.users, runtime.users)
+        self.assertEqual(restored.ping_logs, {5: [(1700000000.5, 6), (1700000001.0, 8)]})
+        self.assertEqual(restored.snapshot_token, self.db.values["snapshot_token"])
+        entry = restored.media_cache[100]
+        self.assertEqual((entry["author_id"], entry["channel_id"], entry["content"]), (3, 4, "hello"))
+        self.assertEqual(bytes(entry["attachments"][0]["media_data"]), b"png-bytes")
+        self.assertEqual(entry["attachments"][0]["filename"], "a.png")
+
+    async def test_first_write_invalidates_token(self):
+        runtime = make_runtime()
+        self.fill(runtime)
+        await self.snapshotter(runtime).write()
+        async with runtime.writing(pool=None):
+            pass
+        self.assertEqual(self.db.values["snapshot_token"], "")
+        self.assertIsNone(runtime.snapshot_token)
+
+        # Users may be out of date now; pings and media don't depend on the DB
+        restored = make_runtime()
+        self.assertTrue(self.snapshotter(restored).load(self.db.values))
+        self.assertEqual(len(restored.users), 0)
+        self.assertIsNone(restored.snapshot_token)
+        self.assertIn(5, restored.ping_logs)
+        self.assertIn(100, restored.media_cache)
+
+    async def test_write_in_flight_keeps_snapshot_untrusted(self):
+        runtime = make_runtime()
+        self.fill(runtime)
+        async with runtime.writing(pool=None):
+            await self.snapshotter(runtime).write()
+        self.assertNotIn("snapshot_token", self.db.values)
+        restored = make_runtime()
+        self.snapshotter(restored).load(self.db.values)
+        self.assertEqual(len(restored.users), 0)
+
+    async def test_counting_mismatch_is_not_trusted(self):
+        runtime = make_runtime()
+        self.fill(runtime)
+        await self.snapshotter(runtime).write()
+        restored = make_runtime()
+        restored.current_count = 43
+        self.snapshotter(restored).load(self.db.values)
+        self.assertEqual(len(restored.users), 0)
+
+    async def test_only_new_attachments_are_appended(self):
+        runtime = make_runtime()
+        self.fill(runtime)
+        snapshots = self.snapshotter(runtime)
+        await snapshots.write()
+        blob = os.path.join(self.directory, snapshots._blob_name)
+        size = os.path.getsize(blob)
+        await snapshots.write()
+        self.assertEqual(os.path.getsize(blob), size)
+        runtime.media_cache[101] = dict(runtime.media_cache[100], attachments=[
+            {"media_data": b"more", "filename": "b.png"},
+        ])
+        await snapshots.write()
+        self.assertEqual(os.path.getsize(blob), size + len(b"more"))
@@ -0,0 +1,19 @@
+# utils.py
+from datetime import datetime, timedelta, timezone
+
+error_log = []
+
+
+def current_time():
+    return datetime.utcnow()
+
+def get_local_time():
+    # Example: UTC+5 offset
+    LOCAL_TIMEZONE_OFFSET = timedelta(hours=5)
+    return datetime.now(timezone.utc) + LOCAL_TIMEZONE_OFFSET
+
+def get_unix_timestamp():
+    return int(get_local_time().timestamp())
+
+def log_error(error_message):
+    error_log.append({"message": error_message, "time": datetime.now(timezone.utc)})